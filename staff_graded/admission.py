@@ -0,0 +1,154 @@
+"""
+Admission control for the CSV import and export handlers.
+
+Imports and exports hold a worker for as long as they run.  Each request
+must take a slot in a per-course and a per-user counting semaphore kept in
+the Django cache, so the limits apply across all worker processes.  When
+no slot is free the request is refused straight away with a retry hint,
+instead of waiting for a worker.  Nothing is queued: the refused request
+has to be retried.
+"""
+
+
+import logging
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+DEFAULT_COURSE_LIMIT = 4
+DEFAULT_USER_LIMIT = 1
+DEFAULT_RETRY_AFTER = 10
+# slots are released when a request finishes; the lease only bounds how long
+# a slot can stay taken if a worker dies mid-request, so it must outlast the
+# longest import or export.
+LEASE_TIMEOUT = 15 * 60
+
+
+class AdmissionDenied(Exception):
+    """
+    Raised when a request is over its concurrency limit.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f'over limit, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class CacheSemaphore:
+    """
+    Counting semaphore shared through the Django cache.
+
+    Each of the ``limit`` slots is a cache key of its own, taken with an
+    atomic ``add`` and holding the holder's token under its own lease.  An
+    expired lease only frees that slot, and a release only frees the slot
+    still held by the releasing token.
+    """
+
+    def __init__(self, key, limit, timeout=LEASE_TIMEOUT):
+        self.key = key
+        self.limit = limit
+        self.timeout = timeout
+
+    def acquire(self):
+        """
+        Take a slot.  Returns the lease to release, or None if every slot is taken.
+        """
+        token = uuid.uuid4().hex
+        for slot in range(self.limit):
+            slot_key = f'{self.key}.slot.{slot}'
+            if cache.add(slot_key, token, self.timeout):
+                return slot_key, token
+        return None
+
+    def release(self, lease):
+        slot_key, token = lease
+        if cache.get(slot_key) == token:
+            cache.delete(slot_key)
+
+
+class HandlerAdmission:
+    """
+    Per-course and per-user admission control for a handler.
+    """
+
+    def __init__(self, name, course_limit=DEFAULT_COURSE_LIMIT, user_limit=DEFAULT_USER_LIMIT,
+                 retry_after=DEFAULT_RETRY_AFTER):
+        self.name = name
+        self.course_limit = course_limit
+        self.user_limit = user_limit
+        self.retry_after = retry_after
+
+    def acquire(self, course_key, user_id):
+        """
+        Take a course and a user slot, returning a callable that releases both.
+
+        Raises AdmissionDenied if either limit is reached.
+        """
+        leases = []
+        semaphores = (
+            CacheSemaphore(f'staff_graded.admission.{self.name}.course.{course_key}', self.course_limit),
+            CacheSemaphore(f'staff_graded.admission.{self.name}.user.{course_key}.{user_id}', self.user_limit),
+        )
+        for semaphore in semaphores:
+            lease = semaphore.acquire()
+            if lease is None:
+                for taken, taken_lease in leases:
+                    taken.release(taken_lease)
+                log.info('Refused %s for user %s in %s', self.name, user_id, course_key)
+                raise AdmissionDenied(self.retry_after)
+            leases.append((semaphore, lease))
+
+        def release():
+            for semaphore, lease in leases:
+                semaphore.release(lease)
+        return release
+
+    @contextmanager
+    def admit(self, course_key, user_id):
+        """
+        Hold a course and a user slot for the duration of the block.
+        """
+        release = self.acquire(course_key, user_id)
+        try:
+            yield
+        finally:
+            release()
+
+
+class ReleasingIterator:
+    """
+    Wrap a response ``app_iter`` so ``release`` is called once it is done.
+
+    The slot is released when iteration finishes or fails, which covers
+    runtimes that read the whole body without closing it, and when the
+    response is closed, which covers clients that stop reading early.
+    """
+
+    def __init__(self, iterable, release):
+        self.iterable = iterable
+        self._release = release
+
+    def __iter__(self):
+        try:
+            yield from self.iterable
+        finally:
+            self._release_once()
+
+    def close(self):
+        """
+        Close the wrapped iterable and release the slot.
+        """
+        close = getattr(self.iterable, 'close', None)
+        try:
+            if close is not None:
+                close()
+        finally:
+            self._release_once()
+
+    def _release_once(self):
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
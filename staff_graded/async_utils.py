@@ -0,0 +1,47 @@
+"""
+Helpers for streaming exports and for the asyncio variant of the import status poll.
+
+The handlers themselves stay synchronous.  ``poll_until_done`` lets ASGI
+runtimes wait for a deferred import without holding a worker thread: each
+check runs through ``sync_to_async(thread_sensitive=True)``, as Django
+recommends for ORM access, and the event loop is free between checks.
+"""
+
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+DEFAULT_POLL_INTERVAL = 0.5
+EXPORT_CHUNK_ROWS = 500
+
+
+async def poll_until_done(func, *args, timeout=0, interval=DEFAULT_POLL_INTERVAL):
+    """
+    Call the synchronous ``func`` until its status is no longer waiting, for up to ``timeout`` seconds.
+
+    Returns the last status ``func`` returned.
+    """
+    check = sync_to_async(func, thread_sensitive=True)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        data = await check(*args)
+        remaining = deadline - loop.time()
+        if not data.get('waiting') or remaining <= 0:
+            return data
+        await asyncio.sleep(min(interval, remaining))
+
+
+def iter_chunks(lines, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Join an iterator of CSV lines into chunks of at most ``chunk_rows`` lines.
+    """
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_rows:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
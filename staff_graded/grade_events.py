@@ -0,0 +1,128 @@
+"""
+Coalescing of course grade recalculation after staff graded score imports.
+
+A CSV import can persist thousands of scores at once.  Rather than letting
+each of them fan out to a course grade recalculation, the affected learners
+are collected per course and recalculated once each when the import commits.
+Up to ``max_learners`` learners of a course are recalculated in place; above
+that the course falls back to the single course-wide recomputation the
+upstream processor uses, so one import never queues more than one grading
+task per course.
+"""
+
+
+import logging
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from opaque_keys.edx.keys import CourseKey
+
+try:
+    from lms.djangoapps.grades import api as grades_api
+except ImportError:
+    grades_api = None
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_LEARNERS = 50
+
+
+class LocalGradeEventQueue:
+    """
+    In-process stand-in for the LMS grades API.
+
+    Learner batches are kept in ``batches`` as ``(course_key, user_ids)``
+    tuples and course-wide recomputations in ``courses``, which makes it
+    usable as a dispatcher in tests and in the workbench.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.courses = []
+
+    def recompute_learners(self, course_key, user_ids):
+        self.batches.append((course_key, list(user_ids)))
+
+    def recompute_course(self, course_key):
+        self.courses.append(course_key)
+
+    def clear(self):
+        self.batches = []
+        self.courses = []
+
+
+class LmsGradeQueue:
+    """
+    Recalculates grades through the LMS grades API.
+    """
+
+    def recompute_learners(self, course_key, user_ids):
+        """
+        Recalculate the course grade of each of ``user_ids`` in this process.
+        """
+        if grades_api is None:
+            log.warning('Grade recalculation unavailable, dropping %d learners for %s', len(user_ids), course_key)
+            return
+        course_key = CourseKey.from_string(str(course_key))
+        users = list(apps.get_model(settings.AUTH_USER_MODEL).objects.filter(id__in=user_ids))
+        grades_api.prefetch_course_and_subsection_grades(course_key, users)
+        factory = grades_api.CourseGradeFactory()
+        for user in users:
+            factory.update(user, course_key=course_key, force_update_subsections=True)
+
+    def recompute_course(self, course_key):
+        """
+        Queue one task recomputing every course grade of ``course_key``.
+        """
+        if grades_api is None:
+            log.warning('Grade recalculation unavailable for %s', course_key)
+            return
+        grades_api.task_compute_all_grades_for_course.apply_async(kwargs={'course_key': str(course_key)})
+
+
+class ScoreChangeCoalescer:
+    """
+    Collects score changes and recalculates each learner's course grade once.
+
+    Learners are grouped by course.  A course with at most ``max_learners``
+    changed learners has them sent to ``dispatch`` in batches of at most
+    ``batch_size``; a course with more is recomputed as a whole.
+    """
+
+    def __init__(self, dispatch=None, batch_size=DEFAULT_BATCH_SIZE, max_learners=DEFAULT_MAX_LEARNERS):
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        self.dispatch = dispatch or LmsGradeQueue()
+        self.batch_size = batch_size
+        self.max_learners = max_learners
+        self._pending = OrderedDict()
+
+    def add(self, course_key, user_id):
+        """
+        Record that ``user_id`` has a new score in ``course_key``.
+        """
+        self._pending.setdefault(str(course_key), OrderedDict())[int(user_id)] = None
+
+    def __len__(self):
+        return sum(len(users) for users in self._pending.values())
+
+    def flush(self):
+        """
+        Recalculate grades for all pending learners and return the number of dispatches.
+        """
+        pending, self._pending = self._pending, OrderedDict()
+        dispatches = 0
+        for course_key, users in pending.items():
+            user_ids = list(users)
+            if len(user_ids) > self.max_learners:
+                self.dispatch.recompute_course(course_key)
+                dispatches += 1
+                log.info('Queued course grade recomputation for %d learners in %s', len(user_ids), course_key)
+                continue
+            for start in range(0, len(user_ids), self.batch_size):
+                self.dispatch.recompute_learners(course_key, user_ids[start:start + self.batch_size])
+                dispatches += 1
+            log.info('Recalculated grades for %d learners in %s', len(user_ids), course_key)
+        return dispatches
@@ -0,0 +1,64 @@
+"""
+Process-local cache of rendered learner fragments.
+
+For learners, everything the student view renders depends only on the
+block's content, the locale and the learner's score, so the serialized
+fragment can be reused for every view with the same key.
+"""
+
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = 1024
+
+
+class FragmentCache:
+    """
+    Bounded, thread-safe LRU mapping of cache keys to serialized fragments.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the entry for ``key``, or None.
+        """
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return None
+            return self._entries[key]
+
+    def set(self, key, value):
+        """
+        Store ``value`` for ``key``, evicting the least recently used entries over ``maxsize``.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def content_version(*values):
+    """
+    Return a short digest identifying the given field values.
+    """
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+fragment_cache = FragmentCache()
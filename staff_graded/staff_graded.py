@@ -3,12 +3,14 @@ XBlock for Staff Graded Points
 """
 
 
-import io
 import json
 import logging
 import os
+from datetime import timezone
 
 import markdown
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.dateparse import parse_datetime
 from web_fragments.fragment import Fragment
 from webob import Response
 from xblock.core import XBlock
@@ -37,10 +39,20 @@ except ImportError:
 
 from bulk_grades.api import ScoreCSVProcessor, get_score, set_score
 
+from .admission import (DEFAULT_COURSE_LIMIT, DEFAULT_RETRY_AFTER, DEFAULT_USER_LIMIT, AdmissionDenied, HandlerAdmission,
+                        ReleasingIterator)
+from .async_utils import iter_chunks, poll_until_done
+from .grade_events import DEFAULT_BATCH_SIZE, DEFAULT_MAX_LEARNERS
+from .processors import ScoreChangesCSVProcessor, StaffGradedScoreCSVProcessor, decode_cursor
+from .render_cache import content_version, fragment_cache
+
 _ = lambda text: text   # pylint: disable=unnecessary-lambda-assignment
 
 log = logging.getLogger(__name__)
 
+# import responses carry at most this many distinct error messages
+MAX_ERROR_MESSAGES = 10
+
 
 @XBlock.needs('settings')
 @XBlock.needs('i18n')
@@ -83,6 +95,15 @@ class StaffGradedXBlock(StudioEditableXBlockMixin, ScorableXBlockMixin, XBlock):
         return self.runtime.service(self, 'user').get_current_user().opt_attrs.get(
             'edx-platform.username')
 
+    def _get_xblock_settings(self):
+        """
+        Return the XBLOCK_SETTINGS bucket for this block, or an empty dict.
+        """
+        settings_service = self.runtime.service(self, 'settings')
+        if settings_service is None:
+            return {}
+        return settings_service.get_settings_bucket(self, default={})
+
     def resource_string(self, path):
         """Handy helper for getting resources from our kit."""
         return self.loader.load_unicode(path)
@@ -92,9 +113,35 @@ class StaffGradedXBlock(StudioEditableXBlockMixin, ScorableXBlockMixin, XBlock):
         The primary view of the StaffGradedXBlock, shown to students
         when viewing courses.
         """
+        from django.utils import translation     # pylint: disable=import-outside-toplevel
+        if context is None:
+            context = {}
+        _ = self.runtime.service(self, "i18n").ugettext
+
+        try:
+            score = get_score(self.location, self.runtime.user_id) or {}      # pylint: disable=no-member
+            grades_available = True
+        except NoSuchServiceError:
+            score = {}
+            grades_available = False
+
+        # For learners the fragment only depends on the content, the locale and the
+        # score, so it is cached under those.  A new score changes the key.
+        cache_key = None
+        if not self.runtime.user_is_staff:
+            cache_key = (
+                str(self.location),     # pylint: disable=no-member
+                content_version(self.display_name, self.instructions, self.weight),
+                translation.get_language(),
+                grades_available,
+                score.get('score'),
+            )
+            cached = fragment_cache.get(cache_key)
+            if cached is not None:
+                return Fragment.from_dict(cached)
+
         frag = Fragment()
         frag.add_css(self.resource_string("static/css/staff_graded.css"))
-        _ = self.runtime.service(self, "i18n").ugettext
 
         # Add i18n js
         statici18n_js_url = self._get_statici18n_js_url()
@@ -129,18 +176,16 @@ class StaffGradedXBlock(StudioEditableXBlockMixin, ScorableXBlockMixin, XBlock):
                                           for k
                                           in ('csrf_token', 'import_url', 'export_url', 'poll_url', 'id')})
 
-        try:
-            score = get_score(self.location, self.runtime.user_id) or {}      # pylint: disable=no-member
-            context['grades_available'] = True
-        except NoSuchServiceError:
-            context['grades_available'] = False
-        else:
+        context['grades_available'] = grades_available
+        if grades_available:
             if score:
                 grade = score['score']
                 context['score_string'] = _('{score} / {total} points').format(score=grade, total=self.weight)
             else:
                 context['score_string'] = _('{total} points possible').format(total=self.weight)
         frag.add_content(self.loader.render_django_template('static/html/staff_graded.html', context))
+        if cache_key is not None:
+            fragment_cache.set(cache_key, frag.to_dict())
         return frag
 
     # TO-DO: change this to create the scenarios you'd like to see in the
@@ -202,48 +247,162 @@ class StaffGradedXBlock(StudioEditableXBlockMixin, ScorableXBlockMixin, XBlock):
         try:
             score_file = request.POST['csv'].file
         except KeyError:
-            data = {'error_rows': [1], 'error_messages': [_('missing file')]}
+            data = {'error_count': 1, 'error_messages': [_('missing file')]}
         else:
-            log.info('Processing %d byte score file %s for %s', score_file.size, score_file.name, self.location)     # pylint: disable=no-member
-            block_id = self.location     # pylint: disable=no-member
-            block_weight = self.weight
-            processor = ScoreCSVProcessor(
-                block_id=str(block_id),
-                max_points=block_weight,
-                user_id=self.runtime.user_id)
-            processor.process_file(score_file, autocommit=True)
-            data = processor.status()
-            log.info('Processed file %s for %s -> %s saved, %s processed, %s error. (async=%s)',
-                     score_file.name,
-                     block_id,
-                     data.get('saved', 0),
-                     data.get('total', 0),
-                     len(data.get('error_rows', [])),
-                     data.get('waiting', False))
+            try:
+                with self._get_admission('import').admit(self.location.course_key, self.runtime.user_id):     # pylint: disable=no-member
+                    data = self._summarize_status(self._import_score_file(score_file))
+            except AdmissionDenied as denied:
+                return self._over_limit_response(denied)
         return Response(json_body=data)
 
+    def _summarize_status(self, data):
+        """
+        Replace the per-row errors of an import status with counts and a link to the annotated CSV.
+
+        This keeps the response the same size however many rows failed.
+        """
+        data = dict(data)
+        data['error_count'] = len(data.pop('error_rows', []))
+        data['error_messages'] = data.get('error_messages', [])[:MAX_ERROR_MESSAGES]
+        if data.get('saved_error_id'):
+            data['error_url'] = self.runtime.handler_url(self, 'csv_errors_handler', str(data['saved_error_id']))
+        return data
+
+    @XBlock.handler
+    def csv_errors_handler(self, request, suffix=''):
+        """
+        Endpoint that streams a failed import back as CSV, annotated with the status and error of each row.
+        """
+        if not self.runtime.user_is_staff:
+            return Response('not allowed', status_code=403)
+        try:
+            processor = StaffGradedScoreCSVProcessor.load(int(suffix))
+        except (ValueError, OSError, ObjectDoesNotExist):
+            # OSError: the operation's data file has expired or was removed
+            return Response('not found', status_code=404)
+        if processor.block_id != str(self.location):     # pylint: disable=no-member
+            return Response('not found', status_code=404)
+
+        rows = processor.get_iterator(error_data=True)
+        resp = Response(app_iter=(chunk.encode('utf-8') for chunk in iter_chunks(rows)))
+        resp.content_type = 'text/csv'
+        resp.charset = 'utf-8'
+        resp.content_disposition = f'attachment; filename="{self.location}-errors.csv"'     # pylint: disable=no-member
+        return resp
+
+    def _import_score_file(self, score_file):
+        """
+        Import the scores in ``score_file`` and return the processor status.
+        """
+        log.info('Processing %d byte score file %s for %s', score_file.size, score_file.name, self.location)     # pylint: disable=no-member
+        block_id = self.location     # pylint: disable=no-member
+        block_weight = self.weight
+        xblock_settings = self._get_xblock_settings()
+        processor = StaffGradedScoreCSVProcessor(
+            block_id=str(block_id),
+            max_points=block_weight,
+            user_id=self.runtime.user_id,
+            grade_event_batch_size=xblock_settings.get('GRADE_EVENT_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            grade_event_max_learners=xblock_settings.get('GRADE_EVENT_MAX_LEARNERS', DEFAULT_MAX_LEARNERS))
+        processor.process_file(score_file, autocommit=True)
+        data = processor.status()
+        log.info('Processed file %s for %s -> %s saved, %s processed, %s error. (async=%s)',
+                 score_file.name,
+                 block_id,
+                 data.get('saved', 0),
+                 data.get('total', 0),
+                 len(data.get('error_rows', [])),
+                 data.get('waiting', False))
+        return data
+
+    def _get_admission(self, name):
+        """
+        Return the admission control for the import or export handler.
+        """
+        xblock_settings = self._get_xblock_settings()
+        return HandlerAdmission(
+            name,
+            course_limit=xblock_settings.get('CSV_COURSE_CONCURRENCY', DEFAULT_COURSE_LIMIT),
+            user_limit=xblock_settings.get('CSV_USER_CONCURRENCY', DEFAULT_USER_LIMIT),
+            retry_after=xblock_settings.get('CSV_RETRY_AFTER', DEFAULT_RETRY_AFTER))
+
+    @staticmethod
+    def _over_limit_response(denied):
+        """
+        Return a 429 response with a Retry-After hint.
+        """
+        resp = Response(json_body={'retry_after': denied.retry_after}, status=429)
+        resp.retry_after = denied.retry_after
+        return resp
+
     @XBlock.handler
     def csv_export_handler(self, request, suffix=''):  # pylint: disable=unused-argument
         """
         Endpoint that handles CSV downloads.
+
+        With a ``since`` timestamp or a ``cursor`` from a previous call, only
+        the scores changed after it are exported, and the cursor for the next
+        call is returned in the ``X-Next-Cursor`` header.
         """
         if not self.runtime.user_is_staff:
             return Response('not allowed', status_code=403)
 
-        track = request.GET.get('track', None)
-        cohort = request.GET.get('cohort', None)
+        since = request.GET.get('since', None)
+        cursor = request.GET.get('cursor', None)
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                return Response('invalid since', status_code=400)
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except ValueError:
+                return Response('invalid cursor', status_code=400)
+
+        try:
+            release = self._get_admission('export').acquire(self.location.course_key, self.runtime.user_id)     # pylint: disable=no-member
+        except AdmissionDenied as denied:
+            return self._over_limit_response(denied)
 
-        buf = io.StringIO()
-        ScoreCSVProcessor(
+        next_cursor = None
+        try:
+            if since or cursor:
+                processor = ScoreChangesCSVProcessor(
+                    block_id=str(self.location),      # pylint: disable=no-member
+                    display_name=self.display_name,
+                    since=since,
+                    cursor=cursor)
+                rows = processor.get_iterator(rows=processor.get_rows_to_export())
+                next_cursor = processor.next_cursor
+            else:
+                track = request.GET.get('track', None)
+                cohort = request.GET.get('cohort', None)
+                rows = self._get_export_processor(track, cohort).get_iterator()
+        except Exception:
+            release()
+            raise
+
+        resp = Response(app_iter=ReleasingIterator((chunk.encode('utf-8') for chunk in iter_chunks(rows)), release))
+        resp.content_type = 'text/csv'
+        resp.charset = 'utf-8'
+        resp.content_disposition = f'attachment; filename="{self.location}.csv"'     # pylint: disable=no-member
+        if next_cursor:
+            resp.headers['X-Next-Cursor'] = next_cursor
+        return resp
+
+    def _get_export_processor(self, track=None, cohort=None):
+        return ScoreCSVProcessor(
             block_id=str(self.location),      # pylint: disable=no-member
             max_points=self.weight,
             display_name=self.display_name,
             track=track,
-            cohort=cohort).write_file(buf)
-        resp = Response(buf.getvalue())
-        resp.content_type = 'text/csv'
-        resp.content_disposition = f'attachment; filename="{self.location}.csv"'     # pylint: disable=no-member
-        return resp
+            cohort=cohort)
 
     @XBlock.handler
     def get_results_handler(self, request, suffix=''):  # pylint: disable=unused-argument
@@ -257,15 +416,32 @@ class StaffGradedXBlock(StudioEditableXBlockMixin, ScorableXBlockMixin, XBlock):
         except KeyError:
             data = {'message': 'missing'}
         else:
-            results = ScoreCSVProcessor().get_deferred_result(result_id)
-            if results.ready():
-                data = results.get()
-                log.info('Got results from celery %r', data)
-            else:
-                data = {'waiting': True, 'result_id': result_id}
-                log.info('Still waiting for %s', result_id)
+            data = self._get_results(result_id)
         return Response(json_body=data)
 
+    def _get_results(self, result_id):
+        """
+        Return the status of a deferred import.
+        """
+        results = ScoreCSVProcessor().get_deferred_result(result_id)
+        if results.ready():
+            data = self._summarize_status(results.get())
+            log.info('Got results from celery %r', data)
+        else:
+            data = {'waiting': True, 'result_id': result_id}
+            log.info('Still waiting for %s', result_id)
+        return data
+
+    async def async_get_results(self, result_id, timeout=0):
+        """
+        Asyncio variant of ``get_results_handler`` for ASGI runtimes.
+
+        Waits up to ``timeout`` seconds for the deferred import to finish.
+        XBlock runtimes only call synchronous handlers, so nothing reaches
+        this yet; ``get_results_handler`` stays the entry point.
+        """
+        return await poll_until_done(self._get_results, result_id, timeout=timeout)
+
     def max_score(self):
         return self.weight
 
@@ -277,8 +453,8 @@ class StaffGradedXBlock(StudioEditableXBlockMixin, ScorableXBlockMixin, XBlock):
         Returns:
             Score(raw_earned=float, raw_possible=float)
         """
-        score = get_score(self.runtime.user_id, self.location)     # pylint: disable=no-member
-        score = score or {'score': 0, 'max_grade': 1}
+        score = get_score(self.location, self.runtime.user_id)     # pylint: disable=no-member
+        score = score or {'score': 0, 'max_grade': self.weight}
         return Score(raw_earned=score['score'], raw_possible=score['max_grade'])
 
     def set_score(self, score):
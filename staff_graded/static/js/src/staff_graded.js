@@ -3,18 +3,21 @@
 
   function doneLoading(blockId, data) {
     $(`#${blockId}-spinner`).hide();
-    if (data.error_rows.length || data.error_messages.length) {
+    if (data.error_count || data.error_messages.length) {
       var message = '';
-      if (data.error_rows.length) {
+      if (data.error_count) {
         message += interpolate_text(
           ngettext('{error_count} error. Please try again. ',
                    '{error_count} errors. Please try again. ',
-                   data.error_rows.length),
-          { error_count: data.error_rows.length });
+                   data.error_count),
+          { error_count: data.error_count });
       }
       if (data.error_messages.length) {
         message += '<br>';
-        message += data.error_messages;
+        message += data.error_messages.join('<br>');
+      }
+      if (data.error_url) {
+        message += '<br><a href="' + data.error_url + '">' + gettext('Download the CSV with errors marked') + '</a>';
       }
     } else {
       var message = interpolate_text(
@@ -30,6 +33,18 @@
     $(`#${blockId}-status .message`).html(message);
   };
 
+  function showOverLimit(blockId, data, template) {
+    $(`#${blockId}-spinner`).hide();
+    var message = interpolate_text(template, { seconds: data.retry_after });
+    $(`#${blockId}-status`).show();
+    $(`#${blockId}-status .message`).html(message);
+  };
+
+  function showExportFailed(blockId) {
+    $(`#${blockId}-status`).show();
+    $(`#${blockId}-status .message`).html(gettext('The export failed. Please try again later.'));
+  };
+
   function pollResults(blockId, poll_url, result_id) {
     $.ajax({
       url: poll_url,
@@ -85,6 +100,12 @@
           } else {
             doneLoading(json_args.id, data);
           }
+        },
+        error : function(xhr) {
+          if (xhr.status === 429 && xhr.responseJSON) {
+            showOverLimit(json_args.id, xhr.responseJSON, gettext(
+              'Too many imports are in progress. Please try again in {seconds} seconds.'));
+          }
         }
       });
 
@@ -98,7 +119,31 @@
                 cohort: $element.find('.cohort-field').val()
             }
         );
-        location.href = url;
+        $element.find('.status').hide();
+        fetch(url, {credentials: 'same-origin'}).then(function(response) {
+          if (response.status === 429) {
+            return response.json().then(function(data) {
+              showOverLimit(json_args.id, data, gettext(
+                'Too many exports are in progress. Please try again in {seconds} seconds.'));
+            });
+          }
+          if (!response.ok) {
+            showExportFailed(json_args.id);
+            return;
+          }
+          var match = /filename="([^"]+)"/.exec(response.headers.get('Content-Disposition') || '');
+          return response.blob().then(function(blob) {
+            var link = document.createElement('a');
+            link.href = URL.createObjectURL(blob);
+            link.download = match ? match[1] : 'scores.csv';
+            document.body.appendChild(link);
+            link.click();
+            document.body.removeChild(link);
+            setTimeout(function() { URL.revokeObjectURL(link.href); }, 0);
+          });
+        }).catch(function() {
+          showExportFailed(json_args.id);
+        });
     });
 
   };
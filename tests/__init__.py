@@ -11,6 +11,8 @@ import os
 import sys
 import types
 
+from tests import bulk_grades_stub
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "staff_graded.locale.settings")
 
 # Mock Open edX and bulk_grades modules for all tests BEFORE importing django
@@ -18,18 +20,8 @@ sys.modules["lms"] = types.ModuleType("lms")
 sys.modules["lms.djangoapps"] = types.ModuleType("lms.djangoapps")
 sys.modules["lms.djangoapps.grades"] = types.ModuleType("lms.djangoapps.grades")
 sys.modules["lms.djangoapps.grades.api"] = types.ModuleType("lms.djangoapps.grades.api")
-bulk_grades_api = types.ModuleType("bulk_grades.api")
-setattr(  # pylint: disable=literal-used-as-attribute
-    bulk_grades_api, "ScoreCSVProcessor", object
-)
-setattr(  # pylint: disable=literal-used-as-attribute
-    bulk_grades_api, "get_score", lambda *a, **kw: None
-)
-setattr(  # pylint: disable=literal-used-as-attribute
-    bulk_grades_api, "set_score", lambda *a, **kw: None
-)
 sys.modules["bulk_grades"] = types.ModuleType("bulk_grades")
-sys.modules["bulk_grades.api"] = bulk_grades_api
+sys.modules["bulk_grades.api"] = bulk_grades_stub
 
 # Patch crum module globally for all tests
 crum = types.ModuleType("crum")
@@ -0,0 +1,48 @@
+"""
+Benchmark of concurrent import status polls with a local result backend.
+
+Not collected by the test suite; run it on its own with::
+
+    python -m tests.benchmark_async_poll [requests] [delay]
+"""
+
+import asyncio
+import sys
+import time
+
+from asgiref.sync import async_to_sync
+
+from staff_graded.async_utils import poll_until_done
+from tests.test_async_utils import LocalResultBackend
+
+
+def polls_per_second(requests, delay, concurrent):
+    backend = LocalResultBackend(delay)
+
+    async def poll(result_id):
+        backend.submit(result_id)
+        return await poll_until_done(backend.status, result_id, timeout=delay + 1, interval=0.01)
+
+    async def poll_all():
+        if concurrent:
+            return await asyncio.gather(*(poll(result_id) for result_id in range(requests)))
+        return [await poll(result_id) for result_id in range(requests)]
+
+    start = time.perf_counter()
+    async_to_sync(poll_all)()
+    return requests / (time.perf_counter() - start)
+
+
+def main(requests=50, delay=0.1):
+    """
+    Print how many imports per second are awaited one after another and concurrently.
+    """
+    sequential = polls_per_second(requests, delay, concurrent=False)
+    concurrent = polls_per_second(requests, delay, concurrent=True)
+    print(f"poll_until_done: {sequential:.1f} results/s in turn, {concurrent:.1f} results/s concurrently "
+          f"({requests} imports ready after {delay}s)")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(*([int(args[0])] if args else []) + [float(arg) for arg in args[1:2]])
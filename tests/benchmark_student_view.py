@@ -0,0 +1,63 @@
+"""
+Benchmark of learner views per second with and without the fragment cache.
+
+Not collected by the test suite; run it on its own with::
+
+    python -m tests.benchmark_student_view [views]
+"""
+
+import sys
+import time
+
+import staff_graded.staff_graded as sg
+from tests.utils import make_block
+
+PATCHED = ('get_score', 'get_course_cohorts', 'modes_for_course')
+
+
+def make_learner_block():
+    block = make_block()
+    block.location = type(
+        "Loc",
+        (),
+        {
+            "html_id": lambda self: "id",
+            "course_key": "course",
+            "__str__": lambda self: "loc",
+        },
+    )()
+    block.runtime.user_is_staff = False
+    return block
+
+
+def views_per_second(block, views, clear_cache):
+    start = time.perf_counter()
+    for _ in range(views):
+        if clear_cache:
+            sg.fragment_cache.clear()
+        block.student_view(context={})
+    return views / (time.perf_counter() - start)
+
+
+def main(views=300):
+    """
+    Print the learner views per second one worker serves, rendered and cached.
+    """
+    originals = {name: getattr(sg, name) for name in PATCHED}
+    sg.get_score = lambda *a, **kw: {"score": 5, "max_grade": 10}
+    sg.get_course_cohorts = lambda course_id=None, **kwargs: []
+    sg.modes_for_course = lambda course_id=None, only_selectable=False, **kwargs: []
+    sg.fragment_cache.clear()
+    try:
+        block = make_learner_block()
+        uncached = views_per_second(block, views, clear_cache=True)
+        cached = views_per_second(block, views, clear_cache=False)
+    finally:
+        sg.fragment_cache.clear()
+        for name, value in originals.items():
+            setattr(sg, name, value)
+    print(f"student_view: {uncached:.0f} views/s rendered, {cached:.0f} views/s cached ({views} views each)")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
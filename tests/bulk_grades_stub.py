@@ -0,0 +1,204 @@
+"""
+Stand-in for ``bulk_grades.api`` used by the tests.
+
+``ScoreCSVProcessor`` follows the upstream class closely enough to drive
+the staff graded processors: rows are staged and committed like
+``super_csv.CSVProcessor``, large commits are deferred like
+``DeferrableMixin``, and ``save``/``load`` keep the JSON state of each
+operation in ``OPERATIONS`` instead of a ``CSVOperation`` file.
+"""
+
+import csv
+import json
+from collections import defaultdict
+
+# operation id -> saved state, or None once the data file has expired
+OPERATIONS = {}
+# block ids whose upstream commit recomputed every course grade
+COURSE_GRADE_RECOMPUTES = []
+# (usage_key, user_id, score, max_points) per set_score call
+SAVED_SCORES = []
+
+
+def get_score(usage_key, user_id):  # pylint: disable=unused-argument
+    return None
+
+
+def get_scores(usage_key, user_ids=None):  # pylint: disable=unused-argument
+    return {}
+
+
+def set_score(usage_key, student_id, score, max_points, override_user_id=None, **defaults):  # pylint: disable=unused-argument
+    if score < 0:
+        raise ValueError('score must be positive')
+    SAVED_SCORES.append((usage_key, student_id, score, max_points))
+
+
+def reset():
+    """Forget all saved operations, recomputes and scores."""
+    OPERATIONS.clear()
+    del COURSE_GRADE_RECOMPUTES[:]
+    del SAVED_SCORES[:]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+class CSVProcessor:
+    """
+    Minimal equivalent of ``super_csv.CSVProcessor``.
+    """
+
+    columns = []
+
+    def __init__(self, **kwargs):
+        self.total_rows = 0
+        self.processed_rows = 0
+        self.saved_rows = 0
+        self.stage = []
+        self.result_data = []
+        self.error_messages = defaultdict(list)
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def add_error(self, message, row=0):
+        self.error_messages[message].append(row)
+
+    def preprocess_row(self, row):
+        return row
+
+    def process_file(self, thefile, autocommit=True):
+        """Stage every row that preprocesses to something, then commit if nothing failed."""
+        rows = list(csv.DictReader(thefile))
+        for rownum, row in enumerate(rows, 1):
+            self.result_data.append(dict(row))
+            row = self.preprocess_row(row)
+            if row:
+                self.stage.append((rownum, row))
+                self.processed_rows += 1
+        self.total_rows = len(rows)
+        if autocommit and self.stage and not self.error_messages:
+            self.commit()
+
+    def commit(self):
+        """Process the staged rows, recording failures on the annotated rows."""
+        saved = 0
+        while self.stage:
+            rownum, row = self.stage.pop(0)
+            try:
+                did_save, __ = self.process_row(row)
+                if did_save:
+                    saved += 1
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self.add_error(str(e), row=rownum)
+                if self.result_data:
+                    self.result_data[rownum - 1]['error'] = str(e)
+                    self.result_data[rownum - 1]['status'] = 'Failure'
+        self.saved_rows = saved
+
+    def status(self):
+        return {
+            'total': self.total_rows,
+            'processed': self.processed_rows,
+            'saved': self.saved_rows,
+            'error_rows': [row for row in self.result_data if row.get('error')],
+            'error_messages': list(self.error_messages.keys()),
+        }
+
+    def get_rows_to_export(self):
+        return []
+
+    def get_iterator(self, rows=None, columns=None, error_data=False):
+        """Yield CSV lines for ``rows``, or for the annotated import rows with ``error_data``."""
+        columns = list(columns or self.columns)
+        if error_data:
+            columns += ['status', 'error']
+            rows = self.result_data if rows is None else rows
+        elif rows is None:
+            rows = self.get_rows_to_export()
+        writer = csv.DictWriter(_Echo(), columns, extrasaction='ignore')
+        yield writer.writerow(dict(zip(columns, columns)))
+        for row in rows:
+            yield writer.writerow(row)
+
+    def process_row(self, row):  # pylint: disable=unused-argument
+        return False, None
+
+
+class DeferrableMixin:
+    """
+    Minimal equivalent of ``super_csv.DeferrableMixin``.
+    """
+
+    size_to_defer = 0
+
+    def save(self, operation_name=None):  # pylint: disable=unused-argument
+        """Record the JSON state, dropping private attributes like the upstream mixin."""
+        state = {k: (list(v) if isinstance(v, set) else v) for k, v in self.__dict__.items() if not k.startswith('_')}
+        state['__class__'] = (type(self).__module__, type(self).__name__)
+        operation_id = len(OPERATIONS) + 1
+        OPERATIONS[operation_id] = json.dumps(state)
+        return type('Operation', (), {'id': operation_id})()
+
+    @classmethod
+    def load(cls, operation_id):
+        """Rebuild a processor from its saved state."""
+        data = OPERATIONS[operation_id]
+        if data is None:
+            raise FileNotFoundError(f'operation {operation_id} has expired')
+        state = json.loads(data)
+        state.pop('__class__')
+        return cls(**state)
+
+    def status(self):
+        status = super().status()
+        status['result_id'] = getattr(self, 'result_id', None)
+        status['saved_error_id'] = getattr(self, 'saved_error_id', None)
+        status['waiting'] = bool(status['result_id'])
+        return status
+
+    def commit(self, running_task=None):
+        if running_task or len(self.stage) <= self.size_to_defer:
+            self.save()
+            super().commit()
+        else:
+            self.result_id = f'task-{self.save().id}'
+
+
+class ScoreCSVProcessor(DeferrableMixin, CSVProcessor):
+    """
+    Minimal equivalent of ``bulk_grades.api.ScoreCSVProcessor``.
+    """
+
+    columns = ['user_id', 'username', 'block_id', 'Previous Points', 'New Points']
+    size_to_defer = 100
+
+    def __init__(self, **kwargs):
+        self.max_points = 1
+        self.user_id = None
+        self.display_name = ''
+        self.block_id = None
+        super().__init__(**kwargs)
+
+    def preprocess_row(self, row):
+        if row['New Points']:
+            return {
+                'user_id': row['user_id'],
+                'block_id': self.block_id,
+                'new_points': float(row['New Points']),
+                'max_points': self.max_points,
+                'override_user_id': self.user_id,
+            }
+        return None
+
+    def process_row(self, row):
+        set_score(row['block_id'], row['user_id'], row['new_points'], row['max_points'], row['override_user_id'])
+        return True, None
+
+    def commit(self, running_task=None):
+        super().commit(running_task=running_task)
+        if running_task or not self.status()['waiting']:
+            # bulk_grades recomputes every course grade after a commit
+            COURSE_GRADE_RECOMPUTES.append(self.block_id)
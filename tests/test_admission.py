@@ -0,0 +1,101 @@
+"""
+Unit tests for the import/export admission control.
+"""
+
+import time
+import unittest
+
+from django.core.cache import cache
+
+from staff_graded.admission import AdmissionDenied, CacheSemaphore, HandlerAdmission, ReleasingIterator
+
+
+class AdmissionTests(unittest.TestCase):
+    """
+    Test suite for HandlerAdmission and its helpers.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_semaphore_limit(self):
+        """The semaphore should hand out at most limit slots."""
+        semaphore = CacheSemaphore("test.semaphore", 2)
+        first = semaphore.acquire()
+        self.assertIsNotNone(semaphore.acquire())
+        self.assertIsNone(semaphore.acquire())
+        semaphore.release(first)
+        self.assertIsNotNone(semaphore.acquire())
+        self.assertIsNone(semaphore.acquire())
+
+    def test_semaphore_lease_expiry(self):
+        """An expired lease should free only its own slot, and its late release should not free another."""
+        semaphore = CacheSemaphore("test.semaphore", 1, timeout=0.2)
+        first = semaphore.acquire()
+        time.sleep(0.3)
+        second = semaphore.acquire()
+        self.assertIsNotNone(second)
+        semaphore.release(first)
+        self.assertIsNone(semaphore.acquire())
+        semaphore.release(second)
+        self.assertIsNotNone(semaphore.acquire())
+        self.assertIsNone(semaphore.acquire())
+
+    def test_user_limit(self):
+        """A user over their limit should be refused even when the course has room."""
+        admission = HandlerAdmission("import", course_limit=5, user_limit=1, retry_after=7)
+        release = admission.acquire("course", 1)
+        for _ in range(3):
+            # retrying does not lengthen the wait
+            with self.assertRaises(AdmissionDenied) as context:
+                admission.acquire("course", 1)
+            self.assertEqual(context.exception.retry_after, 7)
+        admission.acquire("course", 2)()
+        release()
+        admission.acquire("course", 1)()
+
+    def test_course_limit(self):
+        """Requests beyond the course limit should be refused and not hold a user slot."""
+        admission = HandlerAdmission("export", course_limit=2, user_limit=1)
+        releases = [admission.acquire("course", user_id) for user_id in (1, 2)]
+        with self.assertRaises(AdmissionDenied):
+            admission.acquire("course", 3)
+        releases[0]()
+        with admission.admit("course", 3):
+            pass
+
+    def test_releasing_iterator(self):
+        """The slot should be released once a partly read response is closed, and only once."""
+        released = []
+        iterator = ReleasingIterator([b"a", b"b"], lambda: released.append(True))
+        rows = iter(iterator)
+        self.assertEqual(next(rows), b"a")
+        self.assertEqual(released, [])
+        iterator.close()
+        iterator.close()
+        self.assertEqual(released, [True])
+
+    def test_releasing_iterator_releases_on_error(self):
+        """The slot should be released when reading fails, even if the response is never closed."""
+        released = []
+
+        def rows():
+            yield b"a"
+            raise ValueError("boom")
+
+        iterator = ReleasingIterator(rows(), lambda: released.append(True))
+        with self.assertRaises(ValueError):
+            b"".join(iterator)
+        self.assertEqual(released, [True])
+        iterator.close()
+        self.assertEqual(released, [True])
+
+    def test_releasing_iterator_releases_when_read(self):
+        """The slot should be released once the body has been read in full, without close()."""
+        released = []
+        iterator = ReleasingIterator(iter([b"a", b"b"]), lambda: released.append(True))
+        self.assertEqual(b"".join(iterator), b"ab")
+        self.assertEqual(released, [True])
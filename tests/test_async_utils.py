@@ -0,0 +1,87 @@
+"""
+Unit tests for the export chunking and the asyncio import status poll.
+"""
+
+import asyncio
+import time
+import unittest
+
+from asgiref.sync import async_to_sync
+
+from staff_graded.async_utils import iter_chunks, poll_until_done
+
+
+class LocalResultBackend:
+    """Local stand-in for the celery result backend; each result is ready ``delay`` seconds after submission."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.ready_at = {}
+
+    def submit(self, result_id):
+        self.ready_at[result_id] = time.monotonic() + self.delay
+
+    def status(self, result_id):
+        if time.monotonic() >= self.ready_at[result_id]:
+            return {"saved": result_id}
+        return {"waiting": True, "result_id": result_id}
+
+
+class AllCheckedResultBackend:
+    """Result backend whose imports only finish once every one of them has been checked."""
+
+    def __init__(self, requests):
+        self.requests = requests
+        self.checked = set()
+
+    def status(self, result_id):
+        self.checked.add(result_id)
+        if len(self.checked) >= self.requests:
+            return {"saved": result_id}
+        return {"waiting": True, "result_id": result_id}
+
+
+class AsyncUtilsTests(unittest.TestCase):
+    """
+    Test suite for the async helpers.
+    """
+
+    def test_poll_done_result(self):
+        """A finished import should be returned after one check."""
+        backend = LocalResultBackend(0)
+        backend.submit(1)
+        self.assertEqual(async_to_sync(poll_until_done)(backend.status, 1), {"saved": 1})
+
+    def test_poll_times_out(self):
+        """An import still running at the timeout should return the waiting status."""
+        backend = LocalResultBackend(10)
+        backend.submit(1)
+        result = async_to_sync(poll_until_done)(backend.status, 1, timeout=0.05, interval=0.01)
+        self.assertEqual(result, {"waiting": True, "result_id": 1})
+
+    def test_concurrent_polls_share_the_event_loop(self):
+        """Concurrent polls should all be waiting at once rather than run one after another."""
+        requests = 20
+        backend = AllCheckedResultBackend(requests)
+        in_flight = []
+        most_in_flight = []
+
+        async def poll(result_id):
+            in_flight.append(result_id)
+            most_in_flight.append(len(in_flight))
+            try:
+                return await poll_until_done(backend.status, result_id, timeout=5, interval=0.01)
+            finally:
+                in_flight.remove(result_id)
+
+        async def poll_all():
+            return await asyncio.gather(*(poll(result_id) for result_id in range(requests)))
+
+        results = async_to_sync(poll_all)()
+        self.assertEqual(results, [{"saved": result_id} for result_id in range(requests)])
+        self.assertEqual(max(most_in_flight), requests)
+
+    def test_iter_chunks(self):
+        """Lines should be joined into chunks of at most chunk_rows lines."""
+        lines = [f"{i}\n" for i in range(5)]
+        self.assertEqual(list(iter_chunks(lines, chunk_rows=2)), ["0\n1\n", "2\n3\n", "4\n"])
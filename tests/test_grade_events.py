@@ -0,0 +1,116 @@
+"""
+Unit tests for the score change coalescing used by CSV imports.
+"""
+
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from opaque_keys.edx.keys import CourseKey
+
+import staff_graded.grade_events as grade_events
+from staff_graded.grade_events import LmsGradeQueue, LocalGradeEventQueue, ScoreChangeCoalescer
+
+
+class ScoreChangeCoalescerTests(unittest.TestCase):
+    """
+    Test suite for ScoreChangeCoalescer.
+    """
+
+    def setUp(self):
+        self.queue = LocalGradeEventQueue()
+
+    def test_each_learner_dispatched_once(self):
+        """Repeated changes for a learner should result in a single recalculation."""
+        coalescer = ScoreChangeCoalescer(dispatch=self.queue, batch_size=10)
+        for user_id in (1, 2, 1, "2", 3):
+            coalescer.add("course-v1:edX+Demo+2024", user_id)
+        self.assertEqual(len(coalescer), 3)
+        self.assertEqual(coalescer.flush(), 1)
+        self.assertEqual(self.queue.batches, [("course-v1:edX+Demo+2024", [1, 2, 3])])
+
+    def test_batches_per_course(self):
+        """Learners should be grouped by course and split into batches of batch_size."""
+        coalescer = ScoreChangeCoalescer(dispatch=self.queue, batch_size=2)
+        for user_id in range(5):
+            coalescer.add("course-a", user_id)
+        coalescer.add("course-b", 7)
+        self.assertEqual(coalescer.flush(), 4)
+        self.assertEqual(self.queue.batches, [
+            ("course-a", [0, 1]),
+            ("course-a", [2, 3]),
+            ("course-a", [4]),
+            ("course-b", [7]),
+        ])
+
+    def test_large_import_recomputes_course(self):
+        """A course with more than max_learners changed learners should be recomputed once as a whole."""
+        coalescer = ScoreChangeCoalescer(dispatch=self.queue, batch_size=2, max_learners=3)
+        for user_id in range(4):
+            coalescer.add("course-a", user_id)
+        coalescer.add("course-b", 7)
+        self.assertEqual(coalescer.flush(), 2)
+        self.assertEqual(self.queue.courses, ["course-a"])
+        self.assertEqual(self.queue.batches, [("course-b", [7])])
+
+    def test_flush_empties_pending(self):
+        """A second flush without new changes should dispatch nothing."""
+        coalescer = ScoreChangeCoalescer(dispatch=self.queue)
+        coalescer.add("course-a", 1)
+        coalescer.flush()
+        self.queue.clear()
+        self.assertEqual(coalescer.flush(), 0)
+        self.assertEqual(self.queue.batches, [])
+
+    def test_invalid_batch_size(self):
+        """A batch size below one should be rejected."""
+        with self.assertRaises(ValueError):
+            ScoreChangeCoalescer(dispatch=self.queue, batch_size=0)
+
+
+class FakeGradesApi:
+    """Records the calls made to the LMS grades API."""
+
+    def __init__(self):
+        self.calls = []
+        self.task_compute_all_grades_for_course = SimpleNamespace(
+            apply_async=lambda kwargs: self.calls.append(("task_compute_all_grades_for_course", kwargs)))
+
+    def prefetch_course_and_subsection_grades(self, course_key, users):
+        self.calls.append(("prefetch", str(course_key), users))
+
+    def CourseGradeFactory(self):  # pylint: disable=invalid-name
+        return SimpleNamespace(update=lambda user, **kwargs: self.calls.append(("update", user, kwargs)))
+
+
+class LmsGradeQueueTests(unittest.TestCase):
+    """
+    Test suite for LmsGradeQueue.
+    """
+
+    def setUp(self):
+        self.grades_api = FakeGradesApi()
+        self.orig_grades_api = grade_events.grades_api
+        grade_events.grades_api = self.grades_api
+
+    def tearDown(self):
+        grade_events.grades_api = self.orig_grades_api
+
+    def test_recompute_course_sends_one_task(self):
+        """A course-wide recomputation should queue a single grades API task."""
+        LmsGradeQueue().recompute_course("course-v1:edX+Demo+2024")
+        self.assertEqual(self.grades_api.calls,
+                         [("task_compute_all_grades_for_course", {"course_key": "course-v1:edX+Demo+2024"})])
+
+    def test_recompute_learners_in_process(self):
+        """Learner batches should update each course grade in place without queueing tasks."""
+        users = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+        user_model = SimpleNamespace(objects=SimpleNamespace(filter=lambda id__in: users))
+        with mock.patch.object(grade_events, "apps", SimpleNamespace(get_model=lambda model: user_model)):
+            LmsGradeQueue().recompute_learners("course-v1:edX+Demo+2024", [1, 2])
+        course_key = CourseKey.from_string("course-v1:edX+Demo+2024")
+        self.assertEqual(self.grades_api.calls, [
+            ("prefetch", "course-v1:edX+Demo+2024", users),
+            ("update", users[0], {"course_key": course_key, "force_update_subsections": True}),
+            ("update", users[1], {"course_key": course_key, "force_update_subsections": True}),
+        ])
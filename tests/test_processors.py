@@ -0,0 +1,202 @@
+"""
+Unit tests for the staff graded CSV processors.
+"""
+
+import io
+import json
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from django.db.models import Q
+from django.utils.timezone import now
+
+import staff_graded.processors as processors
+
+from staff_graded.grade_events import LocalGradeEventQueue
+from staff_graded.processors import (ScoreChangesCSVProcessor, StaffGradedScoreCSVProcessor, decode_cursor,
+                                     encode_cursor, score_change_row)
+from tests import bulk_grades_stub
+
+BLOCK_ID = "block-v1:edX+Demo+2024+type@staffgradedxblock+block@one"
+COURSE_ID = "course-v1:edX+Demo+2024"
+
+
+def score_file(*rows):
+    """Return a score CSV with a (user_id, New Points) row for each of ``rows``."""
+    lines = ["user_id,username,block_id,Previous Points,New Points"]
+    lines += [f"{user_id},learner{user_id},{BLOCK_ID},,{points}" for user_id, points in rows]
+    return io.StringIO("\n".join(lines) + "\n")
+
+
+class StaffGradedScoreCSVProcessorTests(unittest.TestCase):
+    """
+    Test suite for StaffGradedScoreCSVProcessor.
+    """
+
+    def setUp(self):
+        bulk_grades_stub.reset()
+        self.queue = LocalGradeEventQueue()
+
+    def make_processor(self, **kwargs):
+        processor = StaffGradedScoreCSVProcessor(block_id=BLOCK_ID, max_points=10, user_id=99, **kwargs)
+        processor._coalescer.dispatch = self.queue  # pylint: disable=protected-access
+        return processor
+
+    def test_sync_commit_recalculates_saved_learners(self):
+        """A synchronous import should recalculate each saved learner once instead of the whole course."""
+        processor = self.make_processor(grade_event_batch_size=2)
+        processor.process_file(score_file((1, 5), (2, ""), (3, 7), (4, 1)), autocommit=True)
+        self.assertEqual(len(bulk_grades_stub.SAVED_SCORES), 3)
+        self.assertEqual(bulk_grades_stub.COURSE_GRADE_RECOMPUTES, [])
+        self.assertEqual(self.queue.batches, [(COURSE_ID, [1, 3]), (COURSE_ID, [4])])
+
+    def test_large_import_recomputes_course_once(self):
+        """An import over grade_event_max_learners should queue one course-wide recomputation."""
+        processor = self.make_processor(grade_event_max_learners=2)
+        processor.process_file(score_file((1, 5), (2, 6), (3, 7)), autocommit=True)
+        self.assertEqual(self.queue.courses, [COURSE_ID])
+        self.assertEqual(self.queue.batches, [])
+
+    def test_deferred_commit_flushes_in_task(self):
+        """A deferred import should only recalculate grades once the task has committed the rows."""
+        processor = self.make_processor()
+        processor.size_to_defer = 0
+        processor.process_file(score_file((1, 5), (2, 6)), autocommit=True)
+        self.assertTrue(processor.status()["waiting"])
+        self.assertEqual(self.queue.batches, [])
+        self.assertEqual(bulk_grades_stub.SAVED_SCORES, [])
+
+        operation_id = max(bulk_grades_stub.OPERATIONS)
+        self.assertNotIn("_coalescer", json.loads(bulk_grades_stub.OPERATIONS[operation_id]))
+        task_processor = StaffGradedScoreCSVProcessor.load(operation_id)
+        task_processor._coalescer.dispatch = self.queue  # pylint: disable=protected-access
+        task_processor.commit(running_task=True)
+        self.assertEqual(len(bulk_grades_stub.SAVED_SCORES), 2)
+        self.assertEqual(bulk_grades_stub.COURSE_GRADE_RECOMPUTES, [])
+        self.assertEqual(self.queue.batches, [(COURSE_ID, [1, 2])])
+
+    def test_commit_failure_saves_error_operation(self):
+        """A row failing during commit should leave a loadable operation with the annotated rows."""
+        processor = self.make_processor()
+        processor.process_file(score_file((1, 5), (2, -1)), autocommit=True)
+        status = processor.status()
+        self.assertEqual(status["error_messages"], ["score must be positive"])
+        self.assertIsNotNone(status["saved_error_id"])
+        self.assertEqual(self.queue.batches, [(COURSE_ID, [1])])
+
+        saved = StaffGradedScoreCSVProcessor.load(status["saved_error_id"])
+        self.assertEqual(saved.block_id, BLOCK_ID)
+        lines = list(saved.get_iterator(error_data=True))
+        self.assertTrue(lines[0].rstrip().endswith("status,error"))
+        self.assertEqual(len(lines), 3)
+        self.assertNotIn("Failure", lines[1])
+        self.assertTrue(lines[2].rstrip().endswith("Failure,score must be positive"))
+
+
+class ScoreChangesTests(unittest.TestCase):
+    """
+    Test suite for the incremental export helpers.
+    """
+
+    def test_cursor_round_trip(self):
+        """A cursor should decode to the modification time and row id it was made from."""
+        modified = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(modified, 42)), (modified, 42))
+
+    def test_invalid_cursor(self):
+        """Malformed cursors should raise ValueError."""
+        for cursor in ("", "not-a-cursor", encode_cursor(datetime(2024, 5, 1), 1)[:-4], "WyJ4IiwgMV0="):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_score_change_row(self):
+        """A changed StudentModule should be exported with its score and modification time."""
+        module = SimpleNamespace(
+            student_id=7,
+            student=SimpleNamespace(username="learner"),
+            modified=datetime(2024, 5, 1, 12, tzinfo=timezone.utc),
+            grade=3,
+            max_grade=5.0,
+        )
+        self.assertEqual(score_change_row(module, "block", "Title"), {
+            "user_id": 7,
+            "username": "learner",
+            "block_id": "block",
+            "title": "Title",
+            "modified": "2024-05-01T12:00:00+00:00",
+            "Points": 3.0,
+            "Max Points": 5.0,
+        })
+
+
+class FakeQuerySet:
+    """Queryset stand-in that records filters and returns fixed StudentModules."""
+
+    def __init__(self, modules):
+        self.modules = modules
+        self.filters = []
+        self.ordering = None
+
+    def filter(self, *args, **kwargs):
+        self.filters.append((args, kwargs))
+        return self
+
+    def select_related(self, *fields):  # pylint: disable=unused-argument
+        return self
+
+    def order_by(self, *fields):
+        self.ordering = fields
+        return self
+
+    def __getitem__(self, item):
+        return self.modules[item]
+
+
+class ScoreChangesCSVProcessorTests(unittest.TestCase):
+    """
+    Test suite for ScoreChangesCSVProcessor.
+    """
+
+    def setUp(self):
+        self.modules = [
+            SimpleNamespace(id=i, student_id=i, student=SimpleNamespace(username=f"learner{i}"),
+                            modified=datetime(2024, 5, 1, 12, i, tzinfo=timezone.utc), grade=i, max_grade=10.0)
+            for i in (3, 4)
+        ]
+        self.queryset = FakeQuerySet(self.modules)
+        model = SimpleNamespace(objects=self.queryset)
+        self.orig_apps = processors.apps
+        processors.apps = SimpleNamespace(get_model=lambda app_label, model_name: model)
+
+    def tearDown(self):
+        processors.apps = self.orig_apps
+
+    def test_rows_after_cursor(self):
+        """Rows after the cursor should be exported in order, and the cursor advanced past the last."""
+        cursor = encode_cursor(datetime(2024, 5, 1, 12, 2, tzinfo=timezone.utc), 2)
+        processor = ScoreChangesCSVProcessor(block_id=BLOCK_ID, display_name="Title", cursor=cursor)
+        rows = processor.get_rows_to_export()
+        self.assertEqual([row["user_id"] for row in rows], [3, 4])
+        self.assertEqual(decode_cursor(processor.next_cursor), (self.modules[-1].modified, 4))
+        self.assertEqual(self.queryset.ordering, ("modified", "id"))
+        modified = datetime(2024, 5, 1, 12, 2, tzinfo=timezone.utc)
+        self.assertEqual(self.queryset.filters[-1][0],
+                         (Q(modified__gt=modified) | Q(modified=modified, id__gt=2),))
+
+    def test_recent_rows_are_held_back(self):
+        """Only rows older than settle_seconds should be queried."""
+        processor = ScoreChangesCSVProcessor(block_id=BLOCK_ID, since=datetime(2024, 5, 1, tzinfo=timezone.utc))
+        processor.get_rows_to_export()
+        first_filter = self.queryset.filters[0][1]
+        self.assertLessEqual(first_filter["modified__lte"], now() - timedelta(seconds=processor.settle_seconds))
+        self.assertGreater(first_filter["modified__lte"], now() - timedelta(seconds=processor.settle_seconds + 5))
+        self.assertEqual(self.queryset.filters[-1][1], {"modified__gt": datetime(2024, 5, 1, tzinfo=timezone.utc)})
+
+    def test_empty_page_keeps_cursor(self):
+        """With no new rows the cursor should stay where it was."""
+        self.queryset.modules = []
+        cursor = encode_cursor(datetime(2024, 5, 1, tzinfo=timezone.utc), 9)
+        processor = ScoreChangesCSVProcessor(block_id=BLOCK_ID, cursor=cursor)
+        self.assertEqual(processor.get_rows_to_export(), [])
+        self.assertEqual(processor.next_cursor, cursor)
@@ -0,0 +1,29 @@
+"""
+Tests for the learner fragment cache.
+"""
+
+import unittest
+
+from staff_graded.render_cache import FragmentCache, content_version
+
+
+class FragmentCacheTests(unittest.TestCase):
+    """
+    Test suite for FragmentCache.
+    """
+
+    def test_lru_eviction(self):
+        """The least recently used entry should be evicted once maxsize is exceeded."""
+        cache = FragmentCache(maxsize=2)
+        cache.set(("a", 1), "A")
+        cache.set(("b", 1), "B")
+        self.assertEqual(cache.get(("a", 1)), "A")
+        cache.set(("c", 1), "C")
+        self.assertIsNone(cache.get(("b", 1)))
+        self.assertEqual(cache.get(("a", 1)), "A")
+        self.assertEqual(len(cache), 2)
+
+    def test_content_version(self):
+        """The content version should change with any of the values."""
+        self.assertEqual(content_version("x", "y", 1.0), content_version("x", "y", 1.0))
+        self.assertNotEqual(content_version("x", "y", 1.0), content_version("x", "y", 2.0))
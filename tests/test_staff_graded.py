@@ -5,9 +5,19 @@ This module tests the StaffGradedXBlock in isolation.
 """
 
 import unittest
+from unittest import mock
+from datetime import datetime, timezone
 from collections import namedtuple  # For use in setUp and test_set_score
-from tests.utils import make_block
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+
+from tests import bulk_grades_stub
+from tests.utils import DummyRuntime, make_block
 import staff_graded.staff_graded as sg
+from staff_graded.processors import StaffGradedScoreCSVProcessor
+
+USER_IS_STAFF = DummyRuntime.user_is_staff
 
 
 class StaffGradedXBlockTests(unittest.TestCase):
@@ -22,6 +32,7 @@ class StaffGradedXBlockTests(unittest.TestCase):
         """Set up a fresh StaffGradedXBlock instance and patch all external dependencies."""
         self.block = make_block()
         self.block.location = "dummy_location"
+        sg.fragment_cache.clear()
 
         # Patch ScoreCSVProcessor to a dummy class that accepts arguments and simulates processing
         class DummyScoreCSVProcessor:
@@ -40,9 +51,10 @@ class StaffGradedXBlockTests(unittest.TestCase):
                 return {"saved": 1, "total": 1, "error_rows": [], "waiting": False}
 
         sg.ScoreCSVProcessor = DummyScoreCSVProcessor
+        sg.StaffGradedScoreCSVProcessor = DummyScoreCSVProcessor
 
         # Patch get_score to return a fixed score dict as expected by the XBlock
-        def fake_get_score(user_id, location):  # pylint: disable=unused-argument
+        def fake_get_score(location, user_id):  # pylint: disable=unused-argument
             return {
                 "score": 5,
                 "max_grade": 10,
@@ -62,6 +74,10 @@ class StaffGradedXBlockTests(unittest.TestCase):
             Mode("verified", "Verified Track"),
         ]
 
+    def tearDown(self):
+        """Restore the runtime's user_is_staff property replaced by setup_block_location."""
+        DummyRuntime.user_is_staff = USER_IS_STAFF
+
     def setup_block_location(self, staff=False):
         """Helper to DRY up block location and runtime setup."""
         self.block.location = type(
@@ -107,6 +123,14 @@ class StaffGradedXBlockTests(unittest.TestCase):
         self.assertEqual(score.raw_earned, 5)
         self.assertEqual(score.raw_possible, 10)
 
+    def test_get_score_unscored_uses_weight(self):
+        """An unscored learner should have the block weight as possible points."""
+        sg.get_score = lambda *a, **kw: None
+        self.block.weight = 4.0
+        score = self.block.get_score()
+        self.assertEqual(score.raw_earned, 0)
+        self.assertEqual(score.raw_possible, 4.0)
+
     def test_set_score(self):
         """Block should accept and process a score update without error."""
         Score = namedtuple("Score", ["raw_earned", "raw_possible"])
@@ -128,6 +152,38 @@ class StaffGradedXBlockTests(unittest.TestCase):
         # Output should mention points possible or show a score
         self.assertTrue("points possible" in result.content or "/" in result.content)
 
+    def test_student_view_cached_for_learners(self):
+        """Repeat learner views should reuse the cached fragment until the score or content changes."""
+        self.setup_block_location(staff=False)
+        renders = []
+        orig_render = self.block.loader.render_django_template
+
+        def counting_render(template, context):
+            renders.append(context["score_string"])
+            return orig_render(template, context)
+
+        self.block.loader.render_django_template = counting_render
+        try:
+            first = self.block.student_view(context={})
+            second = self.block.student_view(context={})
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second.js_init_fn, "StaffGradedXBlock")
+            self.assertEqual(len(renders), 1)
+
+            sg.get_score = lambda *a, **kw: {"score": 7, "max_grade": 10}
+            self.assertIn("7 / 1.0 points", self.block.student_view(context={}).content)
+            self.block.weight = 2.0
+            self.assertIn("7 / 2.0 points", self.block.student_view(context={}).content)
+            self.assertEqual(len(renders), 3)
+        finally:
+            self.block.loader.render_django_template = orig_render
+
+    def test_student_view_not_cached_for_staff(self):
+        """Staff views carry a CSRF token and handler URLs, so they should not be cached."""
+        self.setup_block_location(staff=True)
+        self.block.student_view(context={})
+        self.assertEqual(len(sg.fragment_cache), 0)
+
     def test_workbench_scenarios(self):
         """Block should provide workbench scenarios for XBlock SDK integration."""
         scenarios = self.block.workbench_scenarios()
@@ -141,8 +197,7 @@ class StaffGradedXBlockTests(unittest.TestCase):
 
     def test_csv_import_handler_staff(self):
         """CSV import handler should work for staff users and return a response object."""
-        self.block.runtime.user_is_staff = True
-        self.block.location = "dummy_location"
+        self.setup_block_location(staff=True)
 
         class DummyFile:
             size = 1
@@ -154,6 +209,253 @@ class StaffGradedXBlockTests(unittest.TestCase):
         response = self.block.csv_import_handler(DummyRequest())
         self.assertTrue(hasattr(response, "status_code"))
 
+    def test_csv_import_handler_grade_event_settings(self):
+        """CSV import handler should pass the configured grade event batching to the processor."""
+        processors = []
+
+        class CapturingProcessor(StaffGradedScoreCSVProcessor):
+            def process_file(self, thefile, autocommit=True):  # pylint: disable=unused-argument
+                processors.append(self)
+
+        class DummySettings:
+            def get_settings_bucket(self, block, default=None):  # pylint: disable=unused-argument
+                return {"GRADE_EVENT_BATCH_SIZE": 25}
+
+        sg.StaffGradedScoreCSVProcessor = CapturingProcessor
+        self.setup_block_location(staff=True)
+        orig_service = self.block.runtime.service
+        self.block.runtime.service = lambda block, name: DummySettings() if name == "settings" else orig_service(block, name)
+
+        class DummyFile:
+            size = 1
+            name = "dummy.csv"
+
+        class DummyRequest:
+            POST = {"csv": type("F", (), {"file": DummyFile()})()}
+
+        self.block.csv_import_handler(DummyRequest())
+        coalescer = processors[0]._coalescer  # pylint: disable=protected-access
+        self.assertEqual(coalescer.batch_size, 25)
+        self.assertEqual(coalescer.max_learners, sg.DEFAULT_MAX_LEARNERS)
+
+    def test_csv_export_handler_streams(self):
+        """CSV export handler should stream the processor's rows as CSV."""
+        self.setup_block_location(staff=True)
+
+        class ExportProcessor:
+            def __init__(self, **kwargs):
+                pass
+
+            def get_iterator(self):
+                return iter(["user_id,New Points\r\n", "1,\r\n"])
+
+        sg.ScoreCSVProcessor = ExportProcessor
+
+        class DummyRequest:
+            GET = {}
+
+        response = self.block.csv_export_handler(DummyRequest())
+        self.assertEqual(response.content_type, "text/csv")
+        self.assertEqual(response.body, b"user_id,New Points\r\n1,\r\n")
+
+    def test_csv_export_handler_releases_slot_on_error(self):
+        """A failed export should free its slot, whether the rows fail up front or partway through."""
+        cache.clear()
+        self.setup_block_location(staff=True)
+
+        def failing_rows():
+            yield "user_id,New Points\r\n"
+            raise ValueError("boom")
+
+        def failing_iterator():
+            raise ValueError("boom")
+
+        class ExportProcessor:
+            get_rows = None
+
+            def __init__(self, **kwargs):
+                pass
+
+            def get_iterator(self):
+                return ExportProcessor.get_rows()
+
+        sg.ScoreCSVProcessor = ExportProcessor
+
+        class DummyRequest:
+            GET = {}
+
+        ExportProcessor.get_rows = failing_rows
+        response = self.block.csv_export_handler(DummyRequest())
+        with self.assertRaises(ValueError):
+            response.body  # pylint: disable=pointless-statement
+        ExportProcessor.get_rows = failing_iterator
+        with self.assertRaises(ValueError):
+            self.block.csv_export_handler(DummyRequest())
+        ExportProcessor.get_rows = lambda: iter(["user_id,New Points\r\n"])
+        self.assertEqual(self.block.csv_export_handler(DummyRequest()).body, b"user_id,New Points\r\n")
+
+    def test_csv_export_handler_changes_since(self):
+        """CSV export handler should export only changed scores and return the next cursor."""
+        self.setup_block_location(staff=True)
+        captured_kwargs = {}
+
+        class ChangesProcessor:
+            def __init__(self, **kwargs):
+                captured_kwargs.update(kwargs)
+                self.next_cursor = None
+
+            def get_rows_to_export(self):
+                self.next_cursor = "next"
+                return []
+
+            def get_iterator(self, rows=None):  # pylint: disable=unused-argument
+                return iter(["user_id,Points\r\n"])
+
+        class DummyRequest:
+            GET = {"since": "2024-05-01T12:00:00"}
+
+        with mock.patch.object(sg, "ScoreChangesCSVProcessor", ChangesProcessor):
+            response = self.block.csv_export_handler(DummyRequest())
+        self.assertEqual(response.body, b"user_id,Points\r\n")
+        self.assertEqual(response.headers["X-Next-Cursor"], "next")
+        self.assertEqual(captured_kwargs["since"], datetime(2024, 5, 1, 12, tzinfo=timezone.utc))
+        self.assertIsNone(captured_kwargs["cursor"])
+
+    def test_csv_export_handler_invalid_since_or_cursor(self):
+        """CSV export handler should reject malformed since timestamps and cursors."""
+        self.setup_block_location(staff=True)
+        for params in ({"since": "yesterday"}, {"since": "2024-13-01"}, {"cursor": "not-a-cursor"}):
+            request = type("Request", (), {"GET": params})()
+            self.assertEqual(self.block.csv_export_handler(request).status_code, 400)
+
+    def test_csv_handlers_over_limit(self):
+        """Import and export should be refused with a retry hint when over the concurrency limit."""
+        cache.clear()
+        self.setup_block_location(staff=True)
+
+        class DummyFile:
+            size = 1
+            name = "dummy.csv"
+
+        class DummyRequest:
+            POST = {"csv": type("F", (), {"file": DummyFile()})()}
+            GET = {}
+
+        for name, handler in (("import", self.block.csv_import_handler), ("export", self.block.csv_export_handler)):
+            release = self.block._get_admission(name).acquire("course", 1)  # pylint: disable=protected-access
+            try:
+                response = handler(DummyRequest())
+            finally:
+                release()
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.json_body, {"retry_after": 10})
+            self.assertEqual(response.headers["Retry-After"], "10")
+
+    def test_get_results_handler(self):
+        """Results handler should report waiting or the finished result."""
+        self.setup_block_location(staff=True)
+        ready = []
+
+        class DummyResult:
+            def ready(self):
+                return bool(ready)
+
+            def get(self):
+                return {"saved": 3}
+
+        class ResultProcessor:
+            def get_deferred_result(self, result_id):  # pylint: disable=unused-argument
+                return DummyResult()
+
+        sg.ScoreCSVProcessor = ResultProcessor
+
+        class DummyRequest:
+            POST = {"result_id": "abc"}
+
+        response = self.block.get_results_handler(DummyRequest())
+        self.assertEqual(response.json_body, {"waiting": True, "result_id": "abc"})
+        ready.append(True)
+        response = self.block.get_results_handler(DummyRequest())
+        self.assertEqual(response.json_body, {"saved": 3, "error_count": 0, "error_messages": []})
+        self.assertEqual(
+            async_to_sync(self.block.async_get_results)("abc"),
+            {"saved": 3, "error_count": 0, "error_messages": []})
+
+    def test_csv_import_handler_summarizes_errors(self):
+        """CSV import handler should return error counts and a download link instead of the failed rows."""
+        self.setup_block_location(staff=True)
+
+        class FailingProcessor:
+            def __init__(self, **kwargs):
+                pass
+
+            def process_file(self, f, autocommit=True):  # pylint: disable=unused-argument
+                return None
+
+            def status(self):
+                return {
+                    "saved": 0,
+                    "total": 500,
+                    "error_rows": [{"user_id": i, "error": "bad"} for i in range(500)],
+                    "error_messages": [f"message {i}" for i in range(20)],
+                    "saved_error_id": 12,
+                    "waiting": False,
+                }
+
+        sg.StaffGradedScoreCSVProcessor = FailingProcessor
+        self.block.runtime.handler_url = lambda block, handler, suffix="": f"/{handler}/{suffix}"
+
+        class DummyFile:
+            size = 1
+            name = "dummy.csv"
+
+        class DummyRequest:
+            POST = {"csv": type("F", (), {"file": DummyFile()})()}
+
+        data = self.block.csv_import_handler(DummyRequest()).json_body
+        self.assertNotIn("error_rows", data)
+        self.assertEqual(data["error_count"], 500)
+        self.assertEqual(len(data["error_messages"]), sg.MAX_ERROR_MESSAGES)
+        self.assertEqual(data["error_url"], "/csv_errors_handler/12")
+
+    def test_csv_errors_handler(self):
+        """Errors handler should stream the annotated rows of a failed import of this block."""
+        self.setup_block_location(staff=True)
+        loaded = []
+
+        class SavedProcessor:
+            block_id = "loc"
+
+            @classmethod
+            def load(cls, operation_id):
+                if operation_id != 12:
+                    raise sg.ObjectDoesNotExist()
+                loaded.append(operation_id)
+                return cls()
+
+            def get_iterator(self, error_data=False):
+                assert error_data
+                return iter(["user_id,status,error\r\n", "1,Failure,bad\r\n"])
+
+        sg.StaffGradedScoreCSVProcessor = SavedProcessor
+
+        response = self.block.csv_errors_handler(None, "12")
+        self.assertEqual(response.content_type, "text/csv")
+        self.assertEqual(response.body, b"user_id,status,error\r\n1,Failure,bad\r\n")
+        self.assertEqual(self.block.csv_errors_handler(None, "13").status_code, 404)
+        self.assertEqual(self.block.csv_errors_handler(None, "abc").status_code, 404)
+        SavedProcessor.block_id = "other"
+        self.assertEqual(self.block.csv_errors_handler(None, "12").status_code, 404)
+
+    def test_csv_errors_handler_expired(self):
+        """Errors handler should return 404 once the saved operation's data is gone."""
+        self.setup_block_location(staff=True)
+        bulk_grades_stub.reset()
+        operation_id = StaffGradedScoreCSVProcessor(block_id="loc").save("error").id
+        bulk_grades_stub.OPERATIONS[operation_id] = None
+        sg.StaffGradedScoreCSVProcessor = StaffGradedScoreCSVProcessor
+        self.assertEqual(self.block.csv_errors_handler(None, str(operation_id)).status_code, 404)
+
     def test_csv_import_handler_not_staff(self):
         """CSV import handler should return 403 for non-staff users."""
         self.block.runtime.user_is_staff = False